@@ -1,35 +1,157 @@
 import cv2
 import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple
 from picamera2 import Picamera2
 import requests
 import RPi.GPIO as GPIO
 from web3 import Web3
 import json
 import socket
+import logging
+import logging.handlers
+import queue
 
 # Constants for sensitive information
 BLOCKCHAIN_URL = "YOUR_BLOCKCHAIN_URL"
 PRIVATE_KEY = "YOUR_PRIVATE_KEY"
 CONTRACT_ADDRESS = "YOUR_CONTRACT_ADDRESS"
 
+# Logging settings
+LOG_FILE = "tracker.log"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_QUEUE_SIZE = 1000
+LOG_LEVEL = logging.INFO
+# Minimum seconds between two records with the same message on the hot-path logger
+HOT_LOG_INTERVAL = 1.0
+
+# Seconds a cached on-chain pool location is trusted before it is read from the chain again
+POOL_LOCATION_TTL = 300.0
+# Block the contract was deployed in; LocationUpdated event searches never go below it
+CONTRACT_DEPLOY_BLOCK = 0
+# Block range per eth_getLogs call and the furthest back a search goes from the latest block
+LOCATION_EVENT_BLOCK_CHUNK = 5000
+LOCATION_EVENT_LOOKBACK_BLOCKS = 100000
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller; records are dropped when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the writer thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class TrackerLogger(logging.Logger):
+    """Logger that skips the caller lookup; the records never use file/line and the stack walk dominates their cost"""
+
+    def findCaller(self, stack_info=False, stacklevel=1):
+        return "(unknown file)", 0, "(unknown function)", None
+
+class RateLimitedAdapter(logging.LoggerAdapter):
+    """Lets each message template through at most once per interval and counts the rest.
+
+    The check runs before a LogRecord is built, so a suppressed call costs a dict lookup.
+    Calls are keyed on the template alone: "Error in camera loop: %s" with two different
+    errors inside one interval emits the first and counts the second as suppressed.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float):
+        super().__init__(logger, {})
+        self.interval = interval
+        # Shared by the camera, inference, update and button threads
+        self._lock = threading.Lock()
+        self._last_emit: Dict[Any, float] = {}
+        self._suppressed: Dict[Any, int] = {}
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_emit.get(msg, float("-inf")) < self.interval:
+                self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+                return
+            self._last_emit[msg] = now
+            suppressed = self._suppressed.pop(msg, 0)
+        kwargs["extra"] = {"suppressed": suppressed}
+        self.logger.log(level, msg, *args, **kwargs)
+
+class JsonLinesFormatter(logging.Formatter):
+    """One compact JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"))
+
+def setup_logging():
+    """Route the tracker loggers through a bounded queue drained by a background writer thread"""
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(JsonLinesFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    queue_handler = DroppingQueueHandler(log_queue)
+    
+    # Only the tracker loggers get TrackerLogger; web3/urllib3 keep the default class
+    previous_logger_class = logging.getLoggerClass()
+    logging.setLoggerClass(TrackerLogger)
+    try:
+        logger = logging.getLogger("tracker")
+        logging.getLogger("tracker.hot")
+    finally:
+        logging.setLoggerClass(previous_logger_class)
+    
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    listener.start()
+    return listener, queue_handler
+
+log_listener, log_queue_handler = setup_logging()
+# log: one-off events; hot_log: per-frame / per-call paths (camera, inference, LEDs, loops)
+log = logging.getLogger("tracker")
+hot_log = RateLimitedAdapter(logging.getLogger("tracker.hot"), HOT_LOG_INTERVAL)
+
 # Setup web3 connection
 web3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_URL))
 
 # Add the private key for signing transactions
 account = web3.eth.account.from_key(PRIVATE_KEY)
 wallet_address = account.address
-print(f"Using wallet address: {wallet_address}")
+log.info("Using wallet address: %s", wallet_address)
 
 # Contract details
 try:
     with open('abi.json', 'r') as file:
         contract_abi = json.load(file)
     contract = web3.eth.contract(address=CONTRACT_ADDRESS, abi=contract_abi)
-    print("Contract ABI loaded successfully")
+    log.info("Contract ABI loaded successfully")
 except Exception as e:
-    print(f"Error loading contract ABI: {e}")
+    log.error("Error loading contract ABI: %s", e)
     contract = None
 
 # Set up GPIO for buzzer, button, and LEDs
@@ -59,23 +181,12 @@ picam2.start()
 
 qr_detector = cv2.QRCodeDetector()
 
-frame_queue: List[cv2.typing.MatLike] = []
+# (generation, current_item, frame) tuples; the tag lets the inference worker drop frames captured for an earlier item
+frame_queue: "queue.Queue[Tuple[int, int, cv2.typing.MatLike]]" = queue.Queue(maxsize=2)
 results_ready = False
 latest_results: cv2.typing.MatLike = None
 latest_fps: float = 0.0
 running = True
-scanning = False
-qr_data = ""
-qr_confidence = 0.0
-
-items_to_scan = 2
-scanned_items: List[str] = []
-scanning_complete = False
-current_item = 0
-last_scan_time: float = 0.0
-last_duplicate_time: float = 0.0
-awaiting_contract_data = False
-blockchain_processing = False
 
 skip_frames = 4
 
@@ -91,13 +202,100 @@ def get_current_location():
         # In production, this should be replaced with actual location detection
         return f"Location_{hostname}"
     except Exception as e:
-        print(f"Error getting location: {e}")
+        log.error("Error getting location: %s", e)
         return "Unknown_Location"
         
+# The stop this device is deployed at; every pool scanned here is reported at this location
 current_location = get_current_location()
-locations = [current_location, "Final_Destination"]
-current_location_index = 0
-arrived_status = False
+
+class ScanSnapshot(NamedTuple):
+    """Immutable view of the scan state at one point in time"""
+    scanning: bool = False
+    qr_data: str = ""
+    # Set by the inference worker when it publishes qr_data, cleared once the update loop has handled it
+    detection_pending: bool = False
+    qr_confidence: float = 0.0
+    items_to_scan: int = 2
+    scanned_items: Tuple[str, ...] = ()
+    scanning_complete: bool = False
+    current_item: int = 0
+    last_scan_time: float = 0.0
+    last_duplicate_time: float = 0.0
+    awaiting_contract_data: bool = False
+    blockchain_processing: bool = False
+    # Set once the chain has the scanned pool at its final checkpoint
+    arrived_status: bool = False
+    # Bumped on every reset so late results from an older scan session can be dropped
+    generation: int = 0
+
+class ScanState:
+    """Scan state machine shared by the camera, inference, update and button threads.
+
+    All writes go through transition()/update(), which are serialised by a lock and
+    publish a new ScanSnapshot. Readers call snapshot() and never take the lock.
+    """
+
+    def __init__(self, initial: ScanSnapshot):
+        self._lock = threading.Lock()
+        self._snapshot = initial
+
+    def snapshot(self) -> ScanSnapshot:
+        return self._snapshot
+
+    def transition(self, fn: Callable[[ScanSnapshot], Optional[Dict[str, Any]]]) -> Tuple[ScanSnapshot, ScanSnapshot]:
+        """Apply fn(current) -> changes atomically and return (before, after).
+
+        fn must be quick and free of I/O since it runs under the lock. Returning
+        None (or an empty dict) leaves the state untouched and after is before.
+        """
+        with self._lock:
+            before = self._snapshot
+            changes = fn(before)
+            if changes:
+                self._snapshot = before._replace(**changes)
+            return before, self._snapshot
+
+    def update(self, **changes) -> ScanSnapshot:
+        return self.transition(lambda _: changes)[1]
+
+scan_state = ScanState(ScanSnapshot())
+
+class PoolLocationCache:
+    """Last confirmed on-chain location of each pool, used to skip redundant location updates"""
+
+    def __init__(self, ttl: float):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._entries: Dict[int, Tuple[str, float]] = {}
+        # Checkpoints are fixed when a pool is created, so they never expire
+        self._checkpoints: Dict[int, Tuple[str, ...]] = {}
+        self.skipped = 0
+
+    def get(self, pool_id: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(pool_id)
+            if entry is None or time.monotonic() - entry[1] > self._ttl:
+                return None
+            return entry[0]
+
+    def set(self, pool_id: int, location: str):
+        with self._lock:
+            self._entries[pool_id] = (location, time.monotonic())
+
+    def get_checkpoints(self, pool_id: int) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            return self._checkpoints.get(pool_id)
+
+    def set_checkpoints(self, pool_id: int, checkpoints: Tuple[str, ...]):
+        with self._lock:
+            self._checkpoints[pool_id] = checkpoints
+
+    def record_skip(self) -> int:
+        with self._lock:
+            self.skipped += 1
+            return self.skipped
+
+pool_locations = PoolLocationCache(POOL_LOCATION_TTL)
 
 def beep_buzzer(times=1, duration=0.2, pause=0.2):
     for _ in range(times):
@@ -108,117 +306,188 @@ def beep_buzzer(times=1, duration=0.2, pause=0.2):
             time.sleep(pause)
 
 def update_leds(scanning_state, contract_call=False):
-    global blockchain_processing
-    
-    if contract_call or blockchain_processing:
-        print("LED: Setting RED ON for blockchain processing")
+    if contract_call or scan_state.snapshot().blockchain_processing:
+        hot_log.info("LED: Setting RED ON for blockchain processing")
         GPIO.output(GREEN_LED_PIN, GPIO.LOW)
         GPIO.output(RED_LED_PIN, GPIO.HIGH)
     elif scanning_state:
-        print("LED: Setting GREEN ON for scanning")
+        hot_log.info("LED: Setting GREEN ON for scanning")
         GPIO.output(GREEN_LED_PIN, GPIO.HIGH)
         GPIO.output(RED_LED_PIN, GPIO.LOW)
     else:
-        print("LED: Setting RED ON for processing")
+        hot_log.info("LED: Setting RED ON for processing")
         GPIO.output(GREEN_LED_PIN, GPIO.LOW)
         GPIO.output(RED_LED_PIN, GPIO.HIGH)
 
 def get_token_id_from_tx(transaction_hash):
     try:
         if not web3.is_connected() or contract is None:
-            print("Web3 not connected or contract not initialized")
+            log.warning("Web3 not connected or contract not initialized")
             return None
             
-        print(f"Fetching transaction receipt for {transaction_hash}...")
+        log.info("Fetching transaction receipt for %s...", transaction_hash)
         receipt = web3.eth.get_transaction_receipt(transaction_hash)
         
-        print(f"Found {len(receipt['logs'])} logs in transaction")
+        log.info("Found %s logs in transaction", len(receipt['logs']))
         
-        print("Looking for ItemCreated event...")
-        for log in receipt['logs']:
+        log.info("Looking for ItemCreated event...")
+        for receipt_log in receipt['logs']:
             try:
-                decoded_log = contract.events.ItemCreated().process_log(log)
+                decoded_log = contract.events.ItemCreated().process_log(receipt_log)
                 if decoded_log:
-                    print("Found ItemCreated event!")
+                    log.info("Found ItemCreated event!")
                     return decoded_log['args']['tokenId']
             except:
                 pass
         
-        print("Looking for Transfer event...")
-        for log in receipt['logs']:
-            if len(log['topics']) == 4:
-                print(f"Found potential Transfer event with 4 topics")
+        log.info("Looking for Transfer event...")
+        for receipt_log in receipt['logs']:
+            if len(receipt_log['topics']) == 4:
+                log.info("Found potential Transfer event with 4 topics")
                 try:
-                    token_id = int(log['topics'][3].hex(), 16)
-                    print(f"Extracted token ID: {token_id}")
+                    token_id = int(receipt_log['topics'][3].hex(), 16)
+                    log.info("Extracted token ID: %s", token_id)
                     return token_id
                 except Exception as e:
-                    print(f"  Error extracting token ID: {e}")
+                    log.error("Error extracting token ID: %s", e)
         
-        print("Could not determine token ID from transaction")
+        log.info("Could not determine token ID from transaction")
         return 1
     
     except Exception as e:
-        print(f"Error getting token ID: {e}")
+        log.error("Error getting token ID: %s", e)
         return None
 
 def get_pool_id_from_nft(token_id):
     try:
         if not web3.is_connected() or contract is None:
-            print("Web3 not connected or contract not initialized")
+            log.warning("Web3 not connected or contract not initialized")
             return None
             
         item_details = contract.functions.getItemDetails(token_id).call()
         return item_details[2]
     except Exception as e:
-        print(f"Error getting pool ID: {e}")
+        log.error("Error getting pool ID: %s", e)
         return None
 
 def get_pool_items_count(pool_id):
     try:
         if not web3.is_connected() or contract is None:
-            print("Web3 not connected or contract not initialized")
+            log.warning("Web3 not connected or contract not initialized")
             return 0
             
         items = contract.functions.getPoolItems(pool_id).call()
         return len(items)
     except Exception as e:
-        print(f"Error getting pool items count: {e}")
+        log.error("Error getting pool items count: %s", e)
         return 0
 
-def process_transaction_hash(tx_hash):
-    global items_to_scan
+def get_location_events(pool_id):
+    """LocationUpdated events for a pool, searched newest block range first.
+
+    Stops at the first range that has any. The search never goes below CONTRACT_DEPLOY_BLOCK
+    or more than LOCATION_EVENT_LOOKBACK_BLOCKS back, since public RPCs reject or throttle
+    unbounded log queries.
+    """
+    latest_block = web3.eth.block_number
+    lowest_block = max(CONTRACT_DEPLOY_BLOCK, latest_block - LOCATION_EVENT_LOOKBACK_BLOCKS)
+    location_updated = contract.events.LocationUpdated()
+    
+    to_block = latest_block
+    while to_block >= lowest_block:
+        from_block = max(lowest_block, to_block - LOCATION_EVENT_BLOCK_CHUNK + 1)
+        try:
+            events = location_updated.get_logs(argument_filters={'poolId': pool_id}, from_block=from_block, to_block=to_block)
+        except TypeError:
+            # web3.py < 7 spells the block range arguments in camelCase
+            events = location_updated.get_logs(argument_filters={'poolId': pool_id}, fromBlock=from_block, toBlock=to_block)
+        if events:
+            return events
+        to_block = from_block - 1
+    return []
+
+def get_pool_location(pool_id):
+    """Last confirmed location of a pool, from the cache or else from the chain"""
+    cached = pool_locations.get(pool_id)
+    if cached is not None:
+        return cached
+    
+    try:
+        if not web3.is_connected() or contract is None:
+            log.warning("Web3 not connected or contract not initialized")
+            return None
+        
+        location = None
+        try:
+            events = get_location_events(pool_id)
+            if events:
+                location = events[-1]['args']['location']
+        except Exception as e:
+            log.warning("Could not read LocationUpdated events: %s", e)
+        
+        if location is None:
+            # No event in range: fall back to the latest checkpoint that released funds
+            pool_details = contract.functions.getPoolDetails(pool_id).call()
+            checkpoints, checkpoint_index, release_status = pool_details[9], pool_details[10], pool_details[11]
+            pool_locations.set_checkpoints(pool_id, tuple(checkpoints))
+            if checkpoint_index < len(checkpoints) and release_status[checkpoint_index]:
+                location = checkpoints[checkpoint_index]
+        
+        if location is not None:
+            pool_locations.set(pool_id, location)
+        return location
+    except Exception as e:
+        log.error("Error getting pool location: %s", e)
+        return None
+
+def get_pool_checkpoints(pool_id):
+    """Checkpoint names of a pool in route order, from the cache or else from getPoolDetails"""
+    cached = pool_locations.get_checkpoints(pool_id)
+    if cached is not None:
+        return cached
     
+    try:
+        if not web3.is_connected() or contract is None:
+            log.warning("Web3 not connected or contract not initialized")
+            return None
+        
+        checkpoints = tuple(contract.functions.getPoolDetails(pool_id).call()[9])
+        pool_locations.set_checkpoints(pool_id, checkpoints)
+        return checkpoints
+    except Exception as e:
+        log.error("Error getting pool checkpoints: %s", e)
+        return None
+
+def process_transaction_hash(tx_hash):
     if ':' in tx_hash:
         tx_hash = tx_hash.split(':')[-1].strip()
     
     if not tx_hash.startswith('0x'):
         tx_hash = '0x' + tx_hash
     
-    print(f"\n===== PROCESSING TRANSACTION HASH =====")
-    print(f"Transaction Hash: {tx_hash}")
+    log.info("===== PROCESSING TRANSACTION HASH =====")
+    log.info("Transaction Hash: %s", tx_hash)
     
     token_id = get_token_id_from_tx(tx_hash)
     if token_id is None:
-        print("Could not determine token ID, using default item count")
+        log.info("Could not determine token ID, using default item count")
         return 2
     
-    print(f"Found Token ID: {token_id}")
+    log.info("Found Token ID: %s", token_id)
     
     pool_id = get_pool_id_from_nft(token_id)
     if pool_id is None:
-        print("Could not determine pool ID, using default item count")
+        log.info("Could not determine pool ID, using default item count")
         return 2
     
-    print(f"Found Pool ID: {pool_id}")
+    log.info("Found Pool ID: %s", pool_id)
     
     pool_items_count = get_pool_items_count(pool_id)
     if pool_items_count <= 0:
-        print("Pool is empty or error occurred, using default item count")
+        log.warning("Pool is empty or error occurred, using default item count")
         return 2
     
-    print(f"Number of items in pool: {pool_items_count}")
-    print("=====================================\n")
+    log.info("Number of items in pool: %s", pool_items_count)
     
     return pool_items_count
 
@@ -226,159 +495,161 @@ def button_monitor():
     while button_running:
         try:
             if GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-                print("Button was pushed! Starting/resetting scan process...")
+                log.info("Button was pushed! Starting/resetting scan process...")
                 reset_and_start_scan()
                 while GPIO.input(BUTTON_PIN) == GPIO.HIGH and button_running:
                     time.sleep(0.01)
                 time.sleep(0.2)
             time.sleep(0.05)
         except Exception as e:
-            print(f"Error in button monitor: {e}")
+            hot_log.error("Error in button monitor: %s", e)
             time.sleep(0.1)
 
 def reset_and_start_scan():
-    global scanning, qr_data, scanned_items, scanning_complete, current_item
-    global last_scan_time, last_duplicate_time, items_to_scan, awaiting_contract_data
-    global blockchain_processing, current_location_index, arrived_status
-    
-    print("\n======= NEW SCAN STARTED =======")
-    
-    if current_location_index == 0 and not arrived_status and scanned_items:
-        arrived_status = True
+    def start(s):
+        return dict(
+            scanning=True,
+            qr_data="",
+            detection_pending=False,
+            scanned_items=(),
+            scanning_complete=False,
+            current_item=0,
+            last_scan_time=0.0,
+            last_duplicate_time=0.0,
+            awaiting_contract_data=True,
+            blockchain_processing=False,
+            arrived_status=False,
+            generation=s.generation + 1,
+        )
     
-    if arrived_status:
-        print("Status: IT IS ARRIVED!")
-    else:
-        print(f"Current Location: {locations[current_location_index]}")
+    _, state = scan_state.transition(start)
     
-    print("First scan transaction hash to determine items count")
-    print("=================================\n")
+    log.info("======= NEW SCAN STARTED =======")
+    log.info("Current Location: %s", current_location)
     
-    scanning = True
-    qr_data = ""
-    scanned_items = []
-    scanning_complete = False
-    current_item = 0
-    last_scan_time = 0.0
-    last_duplicate_time = 0.0
-    awaiting_contract_data = True
-    blockchain_processing = False
+    log.info("First scan transaction hash to determine items count")
     
-    while frame_queue:
-        frame_queue.pop()
+    clear_frame_queue()
     
-    update_leds(scanning)
+    update_leds(state.scanning)
     
     beep_buzzer(2)
 
+def clear_frame_queue():
+    while True:
+        try:
+            frame_queue.get_nowait()
+        except queue.Empty:
+            return
+
 def update_status_with_debug(message):
-    print(message)
+    log.info(message)
+
+def process_tx_thread(transaction_hash, generation):
+    try:
+        items_to_scan = max(process_transaction_hash(transaction_hash), 1)
+        failed = False
+        update_status_with_debug(f"Total items to scan determined from contract: {items_to_scan}")
+    except Exception as e:
+        log.error("Error processing transaction: %s", e)
+        items_to_scan = 2
+        failed = True
+    
+    def apply(s):
+        if s.generation != generation:
+            return None
+        changes = dict(items_to_scan=items_to_scan, awaiting_contract_data=False, blockchain_processing=False)
+        if failed or s.current_item < items_to_scan:
+            changes.update(scanning=True, qr_data="")
+        else:
+            changes.update(scanning_complete=True)
+        return changes
+    
+    before, after = scan_state.transition(apply)
+    
+    if after is before:
+        log.warning("Scan was reset while fetching blockchain data, discarding result")
+    elif after.scanning_complete:
+        update_status_with_debug(f"All {after.items_to_scan} items scanned!")
+        handle_scanning_complete()
+    else:
+        if failed:
+            log.info("Blockchain data fetch complete. Ready for next scan.")
+        else:
+            update_status_with_debug(f"Scanned {after.current_item}/{after.items_to_scan}. Next scan in 1 second...")
+        update_leds(after.scanning)
 
 def process_scan_result():
-    global scanning, qr_data, scanned_items, current_item, scanning_complete
-    global last_scan_time, last_duplicate_time, items_to_scan, awaiting_contract_data
-    global blockchain_processing
-    
-    if not scanning and qr_data and current_item < items_to_scan and not scanning_complete:
-        if qr_data not in scanned_items:
-            scanned_items.append(qr_data)
-            current_item += 1
-            
-            beep_buzzer(1)
-            
-            if current_item == 1 and awaiting_contract_data:
-                update_status_with_debug("First item scanned! Processing transaction hash...")
-                
-                blockchain_processing = True
-                update_leds(False, contract_call=True)
-                
-                def process_tx_thread(transaction_hash):
-                    global items_to_scan, awaiting_contract_data, blockchain_processing
-                    try:
-                        new_items_count = process_transaction_hash(transaction_hash)
-                        items_to_scan = max(new_items_count, 1)
-                        
-                        update_status_with_debug(f"Total items to scan determined from contract: {items_to_scan}")
-                        
-                        blockchain_processing = False
-                        
-                        if current_item < items_to_scan:
-                            update_status_with_debug(f"Scanned {current_item}/{items_to_scan}. Next scan in 1 second...")
-                            scanning = True
-                            qr_data = ""
-                            update_leds(scanning)
-                        else:
-                            scanning_complete = True
-                            update_status_with_debug(f"All {items_to_scan} items scanned!")
-                            handle_scanning_complete()
-                        
-                        awaiting_contract_data = False
-                    except Exception as e:
-                        print(f"Error processing transaction: {e}")
-                        items_to_scan = 2
-                        awaiting_contract_data = False
-                        blockchain_processing = False
-                        
-                        print("Blockchain data fetch complete. Ready for next scan.")
-                        scanning = True
-                        qr_data = ""
-                        update_leds(scanning)
-                
-                tx_hash_to_process = qr_data
-                
-                tx_thread = threading.Thread(target=process_tx_thread, args=(tx_hash_to_process,))
-                tx_thread.daemon = True
-                tx_thread.start()
-                
-                return
-            
-            if current_item < items_to_scan:
-                update_status_with_debug(f"Scanned item {current_item}/{items_to_scan}. Next scan in 1 second...")
-                last_scan_time = time.time()
-                
-                while frame_queue:
-                    frame_queue.pop()
-                
-                scanning = True
-                qr_data = ""
-                
-                if not blockchain_processing:
-                    update_leds(scanning)
-            else:
-                scanning_complete = True
-                update_status_with_debug(f"All {items_to_scan} items scanned!")
-                handle_scanning_complete()
+    now = time.time()
+    
+    def consume(s):
+        if s.scanning or not s.detection_pending or s.current_item >= s.items_to_scan or s.scanning_complete:
+            return None
+        
+        if s.qr_data in s.scanned_items:
+            if now - s.last_duplicate_time < 1.0:
+                return None
+            changes = dict(last_duplicate_time=now)
+            if now - s.last_scan_time >= 2.0:
+                changes.update(scanning=True, qr_data="", detection_pending=False)
+            return changes
+        
+        changes = dict(
+            scanned_items=s.scanned_items + (s.qr_data,),
+            current_item=s.current_item + 1,
+            detection_pending=False,
+        )
+        if s.current_item + 1 == 1 and s.awaiting_contract_data:
+            # Stay paused until process_tx_thread knows how many items the pool holds
+            changes.update(blockchain_processing=True)
+        elif s.current_item + 1 < s.items_to_scan:
+            changes.update(last_scan_time=now, scanning=True, qr_data="")
         else:
-            current_time = time.time()
-            if current_time - last_duplicate_time >= 1.0:
-                update_status_with_debug(f"Item already scanned! ({current_item}/{items_to_scan})")
-                last_duplicate_time = current_time
-                
-                if current_time - last_scan_time >= 2.0:
-                    scanning = True
-                    qr_data = ""
-                    update_status_with_debug(f"Auto-advancing to scan item {current_item+1} of {items_to_scan}...")
-                    
-                    while frame_queue:
-                        frame_queue.pop()
-                    
-                    if not blockchain_processing:
-                        update_leds(scanning)
+            changes.update(scanning_complete=True)
+        return changes
+    
+    before, after = scan_state.transition(consume)
+    if after is before:
+        return
+    
+    if after.current_item == before.current_item:
+        update_status_with_debug(f"Item already scanned! ({after.current_item}/{after.items_to_scan})")
+        if after.scanning:
+            update_status_with_debug(f"Auto-advancing to scan item {after.current_item+1} of {after.items_to_scan}...")
+            clear_frame_queue()
+            if not after.blockchain_processing:
+                update_leds(after.scanning)
+        return
+    
+    beep_buzzer(1)
+    
+    if after.blockchain_processing and not before.blockchain_processing:
+        update_status_with_debug("First item scanned! Processing transaction hash...")
+        update_leds(False, contract_call=True)
+        
+        tx_thread = threading.Thread(target=process_tx_thread, args=(before.qr_data, after.generation))
+        tx_thread.daemon = True
+        tx_thread.start()
+    elif after.scanning_complete:
+        update_status_with_debug(f"All {after.items_to_scan} items scanned!")
+        handle_scanning_complete()
+    else:
+        update_status_with_debug(f"Scanned item {after.current_item}/{after.items_to_scan}. Next scan in 1 second...")
+        
+        clear_frame_queue()
+        
+        if not after.blockchain_processing:
+            update_leds(after.scanning)
 
 def update_pool_location(pool_id, location):
-    global blockchain_processing
-    
     try:
         if not web3.is_connected() or contract is None:
-            print("Web3 not connected or contract not initialized")
+            log.warning("Web3 not connected or contract not initialized")
             return False
             
-        print(f"\n===== UPDATING POOL LOCATION ON BLOCKCHAIN =====")
-        print(f"Pool ID: {pool_id}")
-        print(f"New Location: {location}")
-        
-        blockchain_processing = True
-        update_leds(False, contract_call=True)
+        log.info("===== UPDATING POOL LOCATION ON BLOCKCHAIN =====")
+        log.info("Pool ID: %s", pool_id)
+        log.info("New Location: %s", location)
         
         tx = contract.functions.updatePoolItemsLocation(pool_id, location).build_transaction({
             'from': wallet_address,
@@ -389,8 +660,6 @@ def update_pool_location(pool_id, location):
         
         signed_tx = web3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
         
-        print(f"Signed transaction structure: {dir(signed_tx)}")
-        
         raw_tx = None
         if hasattr(signed_tx, 'rawTransaction'):
             raw_tx = signed_tx.rawTransaction
@@ -402,72 +671,60 @@ def update_pool_location(pool_id, location):
                 try:
                     if hasattr(signed_tx, attr):
                         raw_tx = getattr(signed_tx, attr)
-                        print(f"Found raw transaction using attribute: {attr}")
+                        log.debug("Found raw transaction using attribute: %s", attr)
                         break
                 except Exception as e:
-                    print(f"Error accessing {attr}: {e}")
+                    log.error("Error accessing %s: %s", attr, e)
             
             if raw_tx is None:
                 try:
                     if isinstance(signed_tx, dict) and 'rawTransaction' in signed_tx:
                         raw_tx = signed_tx['rawTransaction']
-                        print("Found raw transaction in dictionary")
+                        log.debug("Found raw transaction in dictionary")
                     elif isinstance(signed_tx, dict) and 'raw_transaction' in signed_tx:
                         raw_tx = signed_tx['raw_transaction']
-                        print("Found raw transaction in dictionary")
+                        log.debug("Found raw transaction in dictionary")
                     else:
-                        print(f"Transaction structure: {type(signed_tx)}")
+                        log.debug("Transaction structure: %s", type(signed_tx))
                         if hasattr(signed_tx, '__dict__'):
-                            print(f"Transaction dict: {signed_tx.__dict__}")
+                            log.debug("Transaction dict: %s", signed_tx.__dict__)
                 except Exception as e:
-                    print(f"Error accessing dictionary: {e}")
+                    log.error("Error accessing dictionary: %s", e)
         
         if raw_tx is None:
             raise Exception("Could not get raw transaction data - please check web3.py version")
             
         tx_hash = web3.eth.send_raw_transaction(raw_tx)
         
-        print(f"Transaction sent: {tx_hash.hex()}")
-        print("Waiting for transaction confirmation...")
+        log.info("Transaction sent: %s", tx_hash.hex())
+        log.info("Waiting for transaction confirmation...")
         
         receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
         
         if receipt.status == 1:
-            print("Transaction successful!")
-            print(f"Gas used: {receipt.gasUsed}")
-            print("=====================================\n")
+            log.info("Transaction successful!")
+            pool_locations.set(pool_id, location)
+            log.info("Gas used: %s", receipt.gasUsed)
             return True
         else:
-            print("Transaction failed!")
-            print("=====================================\n")
+            log.error("Transaction failed!")
             return False
             
     except Exception as e:
-        print(f"Error updating pool location: {e}")
-        print("=====================================\n")
+        log.error("Error updating pool location: %s", e)
         return False
-    finally:
-        blockchain_processing = False
-        update_leds(scanning)
 
 def handle_scanning_complete():
-    global scanning, qr_data, current_location_index, arrived_status, blockchain_processing
+    state = scan_state.snapshot()
+    scanned_items = state.scanned_items
     
     beep_buzzer(3)
     
-    current_location = locations[current_location_index]
-    
-    print("\n===== SCANNED ITEMS =====")
+    log.info("===== SCANNED ITEMS =====")
+    log.info("Location: %s", current_location)
     
-    if arrived_status:
-        print("Status: IT IS ARRIVED!")
-    else:
-        print(f"Location: {current_location}")
-    
-    print("------------------------")
     for i, item in enumerate(scanned_items):
-        print(f"Item {i+1}: {item}")
-    print("========================\n")
+        log.info("Item %s: %s", i+1, item)
     
     pool_id = None
     if len(scanned_items) > 0:
@@ -481,38 +738,52 @@ def handle_scanning_complete():
             token_id = get_token_id_from_tx(tx_hash)
             if token_id is not None:
                 pool_id = get_pool_id_from_nft(token_id)
-                print(f"Got pool ID: {pool_id} from token ID: {token_id}")
+                log.info("Got pool ID: %s from token ID: %s", pool_id, token_id)
         except Exception as e:
-            print(f"Error getting pool ID from transaction: {e}")
-    
-    if pool_id is not None and not arrived_status:
-        print(f"Updating pool location to {current_location} on blockchain...")
+            log.error("Error getting pool ID from transaction: %s", e)
+    
+    if pool_id is not None:
+        before, after = scan_state.transition(
+            lambda s: dict(blockchain_processing=True) if s.generation == state.generation else None
+        )
+        if after is not before:
+            update_leds(False, contract_call=True)
         
-        blockchain_processing = True
-        update_leds(False, contract_call=True)
-        
-        def update_location_thread(pool_id, location):
-            success = update_pool_location(pool_id, location)
-            global blockchain_processing
-            blockchain_processing = False
-            update_leds(scanning)
+        def update_location_thread(pool_id, location, generation):
+            chain_location = get_pool_location(pool_id)
+            checkpoints = get_pool_checkpoints(pool_id)
+            final_checkpoint = checkpoints[-1] if checkpoints else None
             
-            if success:
-                print("Transaction successful! Beeping 4 times...")
-                beep_buzzer(4, duration=0.15, pause=0.15)
+            if chain_location == location:
+                skipped = pool_locations.record_skip()
+                log.info("Pool %s is already at %s on chain, skipping location update (%s skipped so far)", pool_id, location, skipped)
+            elif chain_location is not None and chain_location == final_checkpoint:
+                log.info("Pool %s already reached its final checkpoint %s, not moving it to %s", pool_id, chain_location, location)
+            else:
+                log.info("Updating pool location to %s on blockchain...", location)
+                if update_pool_location(pool_id, location):
+                    chain_location = location
+                    log.info("Transaction successful! Beeping 4 times...")
+                    beep_buzzer(4, duration=0.15, pause=0.15)
+                else:
+                    log.warning("Location update failed, rescan the pool to retry")
+            
+            arrived = chain_location is not None and chain_location == final_checkpoint
+            if arrived:
+                log.info("Pool %s is at its final checkpoint - IT IS ARRIVED!", pool_id)
+            
+            # A new scan may have started while the transaction was pending; leave its state alone
+            before, after = scan_state.transition(
+                lambda s: dict(blockchain_processing=False, arrived_status=arrived) if s.generation == generation else None
+            )
+            if after is not before:
+                update_leds(after.scanning)
         
-        loc_thread = threading.Thread(target=update_location_thread, args=(pool_id, current_location))
+        loc_thread = threading.Thread(target=update_location_thread, args=(pool_id, current_location, state.generation))
         loc_thread.daemon = True
         loc_thread.start()
     
-    previous_location_index = current_location_index
-    
-    current_location_index = (current_location_index + 1) % len(locations)
-    
-    if previous_location_index == len(locations)-1 and current_location_index == 0:
-        print("All destinations visited - IT IS ARRIVED!")
-    
-    print("Scan complete. Press the button to scan again.")
+    log.info("Scan complete. Press the button to scan again.")
 
 def camera_loop():
     global frame_count, last_frame, running
@@ -527,69 +798,68 @@ def camera_loop():
         try:
             frame = picam2.capture_array()
             if frame is None:
-                print("Warning: Empty frame captured. Retrying...")
+                hot_log.warning("Empty frame captured. Retrying...")
                 time.sleep(0.1)
                 continue
                 
             last_frame = frame.copy()
+            state = scan_state.snapshot()
             
             indicator_frame = last_frame.copy()
             
-            scan_state = "SCANNING" if scanning else "NOT SCANNING"
-            blockchain_state = "BLOCKCHAIN PROCESSING" if blockchain_processing else ""
-            cv2.putText(indicator_frame, f"{scan_state} {blockchain_state}", (10, last_frame.shape[0]-10), 
+            scan_label = "SCANNING" if state.scanning else "NOT SCANNING"
+            blockchain_state = "BLOCKCHAIN PROCESSING" if state.blockchain_processing else ""
+            cv2.putText(indicator_frame, f"{scan_label} {blockchain_state}", (10, last_frame.shape[0]-10), 
                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
             
             frames_to_skip = (frames_to_skip + 1) % skip_frames
             
-            if scanning and frames_to_skip == 0 and len(frame_queue) < 2:
-                frame_queue.append(frame.copy())
+            if state.scanning and frames_to_skip == 0 and not frame_queue.full():
+                frame_queue.put_nowait((state.generation, state.current_item, frame.copy()))
                 cv2.putText(indicator_frame, "ADDED TO QUEUE", (10, last_frame.shape[0]-30), 
                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
             
-            if not scanning and qr_data and not scanning_complete:
-                cv2.putText(indicator_frame, f"QR Data: {qr_data}", (10, 30), 
+            if not state.scanning and state.qr_data and not state.scanning_complete:
+                cv2.putText(indicator_frame, f"QR Data: {state.qr_data}", (10, 30), 
                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(indicator_frame, f"Scanned {current_item}/{items_to_scan}", (10, 60), 
+                cv2.putText(indicator_frame, f"Scanned {state.current_item}/{state.items_to_scan}", (10, 60), 
                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-                if blockchain_processing:
+                if state.blockchain_processing:
                     cv2.putText(indicator_frame, "PROCESSING BLOCKCHAIN DATA...", (10, 90),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 else:
                     cv2.putText(indicator_frame, "Waiting for next scan...", (10, 90),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-            elif scanning:
-                cv2.putText(indicator_frame, f"ACTIVELY SCANNING for item {current_item+1}...", (10, 30),
+            elif state.scanning:
+                cv2.putText(indicator_frame, f"ACTIVELY SCANNING for item {state.current_item+1}...", (10, 30),
                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 
                 if results_ready and latest_results is not None:
                     indicator_frame = latest_results.copy()
-                    cv2.putText(indicator_frame, f"ACTIVELY SCANNING for item {current_item+1}...", (10, 30),
+                    cv2.putText(indicator_frame, f"ACTIVELY SCANNING for item {state.current_item+1}...", (10, 30),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                     
-                    cv2.putText(indicator_frame, f"Queue: {len(frame_queue)}", (10, 120),
+                    cv2.putText(indicator_frame, f"Queue: {frame_queue.qsize()}", (10, 120),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            elif scanning_complete:
+            elif state.scanning_complete:
                 cv2.putText(indicator_frame, "SCAN COMPLETE - Press button to scan again", (10, 30),
                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-                if arrived_status:
+                if state.arrived_status:
                     cv2.putText(indicator_frame, "IT IS ARRIVED!", (10, 60),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 else:
-                    previous_location_index = (current_location_index - 1) % len(locations)
-                    location = locations[previous_location_index]
-                    cv2.putText(indicator_frame, f"Location: {location}", (10, 60),
+                    cv2.putText(indicator_frame, f"Location: {current_location}", (10, 60),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-                if blockchain_processing:
+                if state.blockchain_processing:
                     cv2.putText(indicator_frame, "UPDATING BLOCKCHAIN...", (10, 90),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 
-                y_pos = 120 if blockchain_processing else 90
-                for i, item in enumerate(scanned_items):
+                y_pos = 120 if state.blockchain_processing else 90
+                for i, item in enumerate(state.scanned_items):
                     y_pos += 30
                     if y_pos < indicator_frame.shape[0] - 10:
                         cv2.putText(indicator_frame, f"{i+1}: {item}", (10, y_pos), 
@@ -607,19 +877,22 @@ def camera_loop():
                 reset_and_start_scan()
                 
         except Exception as e:
-            print(f"Error in camera loop: {e}")
+            hot_log.error("Error in camera loop: %s", e)
             time.sleep(0.1)
             
     cv2.destroyAllWindows()
 
 def inference_worker():
-    global scanning, qr_data, qr_confidence, latest_results, latest_fps, results_ready
+    global latest_results, latest_fps, results_ready
     
     while running:
-        if frame_queue and scanning:
+        try:
+            frame_generation, frame_item, frame_to_process = frame_queue.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        
+        if scan_state.snapshot().scanning:
             try:
-                frame_to_process = frame_queue.pop(0)
-                
                 start_time = time.time()
                 
                 try:
@@ -628,7 +901,7 @@ def inference_worker():
                     if "Invalid QR code source points" in str(qr_error):
                         data, bbox = "", None
                     else:
-                        print(f"QR detection error: {qr_error}")
+                        hot_log.error("QR detection error: %s", qr_error)
                         data, bbox = "", None
                 
                 process_time = time.time() - start_time
@@ -649,14 +922,20 @@ def inference_worker():
                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                     
                     if confidence > 5.0:
-                        qr_data = data
-                        qr_confidence = confidence
-                        scanning = False
+                        # Only publish while still scanning for the item this frame was captured for,
+                        # so an unprocessed detection is never overwritten by a stale frame
+                        def publish(s):
+                            if not s.scanning or (s.generation, s.current_item) != (frame_generation, frame_item):
+                                return None
+                            return dict(qr_data=data, qr_confidence=confidence, scanning=False, detection_pending=True)
                         
-                        if not blockchain_processing:
-                            update_leds(scanning)
-                            
-                        print(f"QR detected: {data} with confidence {confidence:.1f}")
+                        before, after = scan_state.transition(publish)
+                        
+                        if after is not before:
+                            if not after.blockchain_processing:
+                                update_leds(after.scanning)
+                                
+                            log.info("QR detected: %s with confidence %.1f", data, confidence)
                 
                 text = f'FPS: {fps:.1f}'
                 cv2.putText(annotated_frame, text, (10, 60), 
@@ -666,10 +945,8 @@ def inference_worker():
                 latest_fps = fps
                 results_ready = True
             except Exception as e:
-                print(f"Error in inference worker: {e}")
+                hot_log.error("Error in inference worker: %s", e)
                 time.sleep(0.1)
-        else:
-            time.sleep(0.001)
 
 last_frame = None
 frame_count = 0
@@ -690,16 +967,16 @@ def update_loop():
             process_scan_result()
             time.sleep(0.1)
         except Exception as e:
-            print(f"Error in update loop: {e}")
+            hot_log.error("Error in update loop: %s", e)
             time.sleep(0.1)
 
 update_thread = threading.Thread(target=update_loop)
 update_thread.daemon = True
 update_thread.start()
 
-print("System ready. Press the button to start scanning.")
-print("Press 'q' in the camera window to quit.")
-print("Press 'r' in the camera window to reset scanning.")
+log.info("System ready. Press the button to start scanning.")
+log.info("Press 'q' in the camera window to quit.")
+log.info("Press 'r' in the camera window to reset scanning.")
 camera_loop()
 
 running = False
@@ -711,4 +988,9 @@ GPIO.output(RED_LED_PIN, GPIO.LOW)
 worker_thread.join(timeout=1.0)
 button_thread.join(timeout=1.0)
 update_thread.join(timeout=1.0)
-GPIO.cleanup()
\ No newline at end of file
+GPIO.cleanup()
+
+log.info("Skipped %s redundant location updates this session", pool_locations.skipped)
+if log_queue_handler.dropped:
+    log.warning("Dropped %s log records because the log queue was full", log_queue_handler.dropped)
+log_listener.stop()
\ No newline at end of file